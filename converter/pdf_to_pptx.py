@@ -2,8 +2,12 @@ import sys
 from pathlib import Path
 import io
 import os
-import json
-import time
+import asyncio
+import hashlib
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Literal
 
 # Get the project root directory (parent of converter/)
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -25,14 +29,20 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image as PptxImage, ImagePart
 
 try:
     from google import genai
     from google.genai import types
+    from aiolimiter import AsyncLimiter
+    from tenacity import (AsyncRetrying, retry_if_exception, stop_after_attempt,
+                          wait_exponential_jitter)
+    from pydantic import BaseModel, Field
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
-    print("⚠️  google-genai not installed. Run: pip3 install google-genai")
+    print("⚠️  google-genai not installed. Run: pip3 install google-genai aiolimiter tenacity pydantic")
 
 # Use absolute paths relative to the script location
 INPUT_PDF = PROJECT_ROOT / "input" / "slides.pdf"
@@ -41,6 +51,59 @@ OUTPUT_PPTX = PROJECT_ROOT / "output" / "output.pptx"
 # Gemini API configuration - Set your API key here or via environment variable
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 
+# Requests per minute allowed for the primary model (gemini-2.5-flash-lite free tier)
+GEMINI_MAX_RPM = 10
+
+# Longest single wait between rate-limited attempts, whatever the API suggests
+MAX_RETRY_WAIT = 60
+
+# Background render resolution - 150 dpi already exceeds what PowerPoint shows on a 13.3" slide
+BACKGROUND_DPI = 150
+
+# Slides sent to Gemini per request - each request counts once against the RPM limit
+GEMINI_BATCH_SIZE = 4
+
+# Text box layout constants, resolved once instead of per element/line
+_MIN_W = Inches(1)
+_MIN_H = Inches(0.4)
+_FALLBACK_W = Inches(2)
+_FALLBACK_H = Inches(0.6)
+_PAD = Inches(0.2)
+_ALIGN = {"center": PP_ALIGN.CENTER, "right": PP_ALIGN.RIGHT, "left": PP_ALIGN.LEFT}
+
+# Leading bullet markers ("•", "-", "*" and any spaces between them) on a text line
+_BULLET_RE = re.compile(r'^[•\-*][•\-*\s]*')
+
+
+# ============ Structured output schema for Gemini ============
+
+# Only defined when the AI dependencies are installed - image-only mode
+# must keep working without pydantic
+if GEMINI_AVAILABLE:
+    class Position(BaseModel):
+        x_percent: float = Field(description="Left edge, 0-100% of slide width")
+        y_percent: float = Field(description="Top edge, 0-100% of slide height")
+        width_percent: float = Field(description="0-100% of slide width")
+        height_percent: float = Field(description="0-100% of slide height")
+
+    class TextStyle(BaseModel):
+        font_size: int = Field(description="In points, estimated from visual size")
+        font_color: str = Field(description="Hex color #RRGGBB")
+        bold: bool
+        italic: bool
+        alignment: Literal["left", "center", "right"]
+
+    class SlideElement(BaseModel):
+        type: Literal["title", "subtitle", "heading", "body", "bullet", "caption"]
+        text: str = Field(description="Exact text content")
+        position: Position
+        style: TextStyle
+        bullet_level: int = Field(description="0 = no bullet, 1-3 = bullet indent level")
+
+    class SlideData(BaseModel):
+        background_color: str = Field(description="Hex color #RRGGBB")
+        elements: List[SlideElement]
+
 
 def get_gemini_client():
     """Get Gemini API client with the API key."""
@@ -51,68 +114,131 @@ def get_gemini_client():
         return None
     
     client = genai.Client(api_key=GEMINI_API_KEY)
+    
+    # Cheap preflight so a bad key fails before any page is rendered
+    try:
+        next(iter(client.models.list()), None)
+    except Exception as e:
+        print(f"❌ Error: Could not reach Gemini with GEMINI_API_KEY - {e}")
+        return None
+    
     return client
 
 
-def render_page_to_pil_image(page, dpi=100, for_ai=True):
+def render_page_to_pil_image(page, dpi=BACKGROUND_DPI):
     """Render PDF page to PIL Image.
     
     Args:
         page: PyMuPDF page object
-        dpi: Resolution (100 for AI analysis, 200 for background image)
-        for_ai: If True, resize for AI token efficiency. If False, keep high quality.
+        dpi: Resolution (BACKGROUND_DPI for a slide background)
     """
     zoom = dpi / 72
     mat = fitz.Matrix(zoom, zoom)
     pix = page.get_pixmap(matrix=mat, alpha=False)
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def render_page_for_ai_and_background(page, dpi=BACKGROUND_DPI, ai_dpi=100, max_dim=1200):
+    """Rasterize a page once and derive both the background and AI images from it.
     
-    # Only resize for AI analysis to save tokens
-    if for_ai:
-        max_dimension = 1200
-        if img.width > max_dimension or img.height > max_dimension:
-            ratio = min(max_dimension / img.width, max_dimension / img.height)
-            new_size = (int(img.width * ratio), int(img.height * ratio))
-            img = img.resize(new_size, Image.LANCZOS)
+    The AI image is box-averaged down from the background image by whole
+    powers of two (``Image.reduce``), with one LANCZOS pass only when the
+    remaining factor is not a power of two or ``max_dim`` still applies.
+    The background is encoded here as the final slide JPEG, so the main
+    process can embed it without decoding or re-encoding.
+    
+    Returns:
+        ((ai_bytes, ai_mime_type), (background_bytes, background_mime_type))
+    """
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    bg_image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    background = (encode_background_image(bg_image), "image/jpeg")
     
-    return img
+    scale = min(ai_dpi / dpi, max_dim / bg_image.width, max_dim / bg_image.height)
+    target_size = (max(1, int(bg_image.width * scale)), max(1, int(bg_image.height * scale)))
+    
+    halvings = 0
+    while scale * 2 ** (halvings + 1) <= 1:
+        halvings += 1
+    ai_img = bg_image.reduce(2 ** halvings) if halvings else bg_image
+    if ai_img.size != target_size:
+        ai_img = ai_img.resize(target_size, Image.LANCZOS)
+    
+    img_bytes = io.BytesIO()
+    ai_img.save(img_bytes, format='JPEG', quality=80)
+    ai_image = (img_bytes.getvalue(), "image/jpeg")
+    
+    return ai_image, background
 
 
-def analyze_slide_with_gemini(client, image, slide_num, max_retries=3):
-    """Use Gemini AI to analyze a slide image and extract structured content."""
+def _render(pdf_path, page_num, dpi):
+    """Render a single page in a worker process.
     
-    # Convert PIL image to bytes
-    img_bytes = io.BytesIO()
-    image.save(img_bytes, format='PNG')
-    img_bytes.seek(0)
-    image_data = img_bytes.read()
-    
-    prompt = """Analyze this presentation slide image and extract ALL content with precise styling information.
-
-Return a JSON object with this EXACT structure:
-{
-    "background_color": "#HEXCOLOR",
-    "elements": [
-        {
-            "type": "title" | "subtitle" | "heading" | "body" | "bullet" | "caption",
-            "text": "exact text content",
-            "position": {
-                "x_percent": 0-100,
-                "y_percent": 0-100,
-                "width_percent": 0-100,
-                "height_percent": 0-100
-            },
-            "style": {
-                "font_size": number (in points, estimate based on visual size),
-                "font_color": "#HEXCOLOR",
-                "bold": true/false,
-                "italic": true/false,
-                "alignment": "left" | "center" | "right"
-            },
-            "bullet_level": 0-3 (0 = no bullet, 1+ = bullet indent level)
-        }
-    ]
-}
+    Each call opens its own document: PyMuPDF holds the GIL, so pages are
+    rendered in separate processes and only plain bytes cross the boundary.
+    
+    Returns:
+        ((ai_bytes, mime_type), (background_bytes, mime_type))
+    """
+    with fitz.open(pdf_path) as doc:
+        return render_page_for_ai_and_background(doc[page_num], dpi=dpi)
+
+
+def _is_rate_limit(error):
+    """True if a Gemini error is a 429 / RESOURCE_EXHAUSTED response."""
+    error_str = str(error)
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
+def _suggested_retry_delay(error):
+    """Seconds the API asked us to wait (Retry-After header or RetryInfo), or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []):
+            if detail.get("@type", "").endswith("google.rpc.RetryInfo"):
+                try:
+                    return float(detail.get("retryDelay", "").rstrip("s"))  # e.g. "23s"
+                except ValueError:
+                    pass
+    return None
+
+
+def _wait_for_rate_limit(retry_state):
+    """Wait as long as the API suggests, else back off exponentially with jitter."""
+    delay = _suggested_retry_delay(retry_state.outcome.exception())
+    if delay is not None:
+        return min(delay, MAX_RETRY_WAIT)
+    return wait_exponential_jitter(initial=2, max=MAX_RETRY_WAIT)(retry_state)
+
+
+async def analyze_slide_with_gemini(client, images, slide_nums, limiter, max_retries=5):
+    """Use Gemini AI to analyze slide images and extract structured content.
+    
+    All ``images`` ((image_bytes, mime_type) pairs) are sent in a single
+    request, so a batch of slides costs one request against the RPM limit.
+    Requests are paced by the shared ``limiter`` so several batches can be
+    in flight at once without exceeding the model's RPM limit.
+    
+    Returns:
+        List of slide data dicts in the same order as ``images``. If a
+        response arrived but did not match the schema, the list holds None
+        for every slide. If no response could be obtained (rate limits,
+        API errors on every model), returns None.
+    """
+    label = f"Slide {slide_nums[0]}" if len(slide_nums) == 1 else f"Slides {', '.join(map(str, slide_nums))}"
+    
+    prompt = f"""Analyze these {len(images)} presentation slide images and extract ALL content with precise styling information.
+Return an array of {len(images)} slide objects in the same order as the images.
 
 IMPORTANT RULES:
 1. Extract ALL text visible on the slide - don't miss anything
@@ -122,8 +248,7 @@ IMPORTANT RULES:
 5. Detect bullet points and their indent levels
 6. Extract accurate colors - background and text colors (use hex format #RRGGBB)
 7. Title/heading text is usually 28-48pt, body text 16-24pt, captions 10-14pt
-8. For multi-line text blocks, include all lines in the "text" field separated by newlines
-9. Return ONLY valid JSON, no markdown code blocks, no explanation"""
+8. For multi-line text blocks, include all lines in the "text" field separated by newlines"""
 
     # Models to try (fallback order) - prioritize by free tier RPM limits
     # gemini-2.5-flash-lite: 10 RPM (best for free tier)
@@ -131,58 +256,133 @@ IMPORTANT RULES:
     # gemini-3-flash: 5 RPM
     models = ["gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.0-flash"]
     
+    # Build the request payload once; it is identical for every retry and model
+    image_parts = [types.Part.from_bytes(data=image_data, mime_type=mime_type)
+                   for image_data, mime_type in images]
+    contents = [prompt, *image_parts]
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=List[SlideData],
+    )
+    
+    def log_rate_limit(retry_state):
+        print(f"   ⏳ {label}: Rate limited, waiting {retry_state.next_action.sleep:.0f}s "
+              f"(attempt {retry_state.attempt_number}/{max_retries})...")
+    
     for model_name in models:
-        for attempt in range(max_retries):
-            try:
-                # Create image part for the API
-                image_part = types.Part.from_bytes(data=image_data, mime_type="image/png")
-                
-                response = client.models.generate_content(
-                    model=model_name,
-                    contents=[prompt, image_part]
-                )
-                
-                # Extract JSON from response
-                response_text = response.text.strip()
-                
-                # Remove markdown code blocks if present
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                elif response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                
-                response_text = response_text.strip()
-                
-                slide_data = json.loads(response_text)
+        try:
+            # Only rate limits are retried; any other error moves on to the next model
+            async for attempt in AsyncRetrying(
+                retry=retry_if_exception(_is_rate_limit),
+                wait=_wait_for_rate_limit,
+                stop=stop_after_attempt(max_retries),
+                before_sleep=log_rate_limit,
+                reraise=True,
+            ):
+                with attempt:
+                    async with limiter:
+                        response = await client.aio.models.generate_content(
+                            model=model_name,
+                            contents=contents,
+                            config=config
+                        )
+            
+            # The SDK validates the JSON against the schema for us
+            if response.parsed is None or len(response.parsed) != len(images):
+                print(f"   ⚠ {label}: Response did not match the slide schema")
+                return [None] * len(images)
+            
+            all_slide_data = [slide.model_dump() for slide in response.parsed]
+            for slide_num, slide_data in zip(slide_nums, all_slide_data):
                 element_count = len(slide_data.get('elements', []))
                 print(f"   ✓ Slide {slide_num}: Extracted {element_count} elements")
-                return slide_data
-                
-            except json.JSONDecodeError as e:
-                print(f"   ⚠ Slide {slide_num}: JSON parse error - {e}")
-                return None
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    # Rate limit - wait and retry with shorter intervals
-                    # 10 RPM = 1 request per 6 seconds, so wait 10-20s should be enough
-                    wait_time = 15 * (attempt + 1)  # 15s, 30s, 45s
-                    print(f"   ⏳ Slide {slide_num}: Rate limited, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"   ⚠ Slide {slide_num}: AI error with {model_name} - {e}")
-                    break  # Try next model
-    
-    print(f"   ⚠ Slide {slide_num}: All retries failed")
+            return all_slide_data
+            
+        except Exception as e:
+            if _is_rate_limit(e):
+                print(f"   ⚠ {label}: Still rate limited on {model_name} after {max_retries} attempts")
+            else:
+                print(f"   ⚠ {label}: AI error with {model_name} - {e}")
+            # Try next model
+    
+    print(f"   ⚠ {label}: All retries failed")
     return None
 
 
+async def analyze_slides_with_gemini(client, render_futures):
+    """Analyze all slides concurrently, returning results in page order.
+    
+    ``render_futures`` resolve to the ``(ai_image, background_image)`` pairs
+    returned by ``_render``. Pages are grouped into batches of
+    ``GEMINI_BATCH_SIZE`` and each batch is sent to Gemini as soon as its
+    render futures complete. Slides that render byte-for-byte identical to
+    an earlier one (repeated title or section pages) reuse its analysis
+    instead of being sent again.
+    """
+    limiter = AsyncLimiter(max_rate=GEMINI_MAX_RPM, time_period=60)
+    loop = asyncio.get_running_loop()
+    analyzed = {}  # background SHA1 -> (slide_num, future resolving to slide_data)
+    
+    async def analyze_batch(page_nums):
+        to_analyze = []  # (slide_num, image, future) for slides sent in this batch
+        slide_results = {}  # slide_num -> future resolving to its slide_data
+        
+        for page_num in page_nums:
+            image, (bg_data, _) = await asyncio.wrap_future(render_futures[page_num])
+            slide_num = page_num + 1
+            
+            # Rendering is deterministic, so identical bytes mean an identical page
+            key = hashlib.sha1(bg_data).hexdigest()
+            if key in analyzed:
+                other_num, result = analyzed[key]
+                print(f"   ✓ Slide {slide_num}: Identical to slide {other_num}, reusing its analysis")
+            else:
+                result = loop.create_future()
+                analyzed[key] = (slide_num, result)
+                to_analyze.append((slide_num, image, result))
+            slide_results[slide_num] = result
+        
+        batch_data = [None] * len(to_analyze)
+        try:
+            if to_analyze:
+                slide_nums = [slide_num for slide_num, _, _ in to_analyze]
+                images = [image for _, image, _ in to_analyze]
+                batch_data = await analyze_slide_with_gemini(client, images, slide_nums, limiter)
+                
+                # A batch response that did not parse is retried page by page; a
+                # batch whose requests failed outright would only fail again
+                parse_failed = batch_data is not None and all(data is None for data in batch_data)
+                if parse_failed and len(to_analyze) > 1:
+                    print(f"   ↻ Slides {', '.join(map(str, slide_nums))}: Retrying one slide at a time")
+                    single_results = await asyncio.gather(*(
+                        analyze_slide_with_gemini(client, [image], [slide_num], limiter)
+                        for slide_num, image in zip(slide_nums, images)
+                    ))
+                    batch_data = [result[0] if result else None for result in single_results]
+        finally:
+            # Always resolve, so duplicates waiting on these slides never hang
+            for (_, _, result), slide_data in zip(to_analyze, batch_data or [None] * len(to_analyze)):
+                result.set_result(slide_data)
+        
+        return [await slide_results[page_num + 1] for page_num in page_nums]
+    
+    batches = [range(start, min(start + GEMINI_BATCH_SIZE, len(render_futures)))
+               for start in range(0, len(render_futures), GEMINI_BATCH_SIZE)]
+    batch_results = await asyncio.gather(*(analyze_batch(page_nums) for page_nums in batches))
+    return [slide_data for results in batch_results for slide_data in results]
+
+
 def hex_to_rgb(hex_color):
     """Convert hex color to RGB tuple."""
     if not hex_color:
         return (0, 0, 0)
+    # Normalize first so "#ABCDEF" and "#abcdef" share a cache entry
+    return _parse_hex_color(hex_color.lower())
+
+
+@lru_cache(maxsize=512)
+def _parse_hex_color(hex_color):
+    """Cached parse of a normalized hex color - slides reuse a handful of colors."""
     hex_color = hex_color.lstrip('#')
     if len(hex_color) == 6:
         try:
@@ -192,26 +392,56 @@ def hex_to_rgb(hex_color):
     return (0, 0, 0)
 
 
-def create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, background_image=None):
-    """Create a PPTX slide from AI-extracted data with optional background image."""
+def encode_background_image(image):
+    """Encode a rendered page as JPEG for embedding as a slide background.
+    
+    Pages are rendered without alpha, so JPEG loses nothing we need and is
+    much faster to encode and smaller to store than an optimized PNG.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    img_bytes = io.BytesIO()
+    image.save(img_bytes, format='JPEG', quality=85, optimize=True, progressive=True)
+    return img_bytes.getvalue()
+
+
+def add_background_picture(slide, blob, slide_width, slide_height, image_parts):
+    """Add a picture covering the whole slide, storing each unique image only once.
+    
+    ``image_parts`` maps SHA1 -> ImagePart and should be shared by every slide
+    of a presentation. Repeated backgrounds (template pages) are related to
+    the existing media part instead of going through ``add_picture``, which
+    re-parses the image and re-hashes every image already in the package.
+    """
+    sha1 = hashlib.sha1(blob).hexdigest()
+    
+    image_part = image_parts.get(sha1)
+    if image_part is None:
+        image_part = ImagePart.new(slide.part.package, PptxImage.from_blob(blob))
+        image_parts[sha1] = image_part
+    rId = slide.part.relate_to(image_part, RT.IMAGE)
+    
+    pic = slide.shapes._add_pic_from_image_part(image_part, rId, 0, 0, slide_width, slide_height)
+    return slide.shapes._shape_factory(pic)
+
+
+def create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, background_data=None, image_parts=None):
+    """Create a PPTX slide from AI-extracted data with optional background image.
+    
+    ``background_data`` is the already-encoded image (see
+    ``encode_background_image``). Pass the same ``image_parts`` dict for every slide so identical
+    backgrounds share one media file in the PPTX.
+    """
+    if image_parts is None:
+        image_parts = {}
     
     blank_layout = prs.slide_layouts[6]
     slide = prs.slides.add_slide(blank_layout)
     
     # Add background image first (if provided) - this preserves all visuals from PDF
-    if background_image:
-        img_bytes = io.BytesIO()
-        background_image.save(img_bytes, format='PNG', optimize=True)
-        img_bytes.seek(0)
-        
+    if background_data:
         # Add image covering the entire slide as background
-        bg_shape = slide.shapes.add_picture(
-            img_bytes,
-            Inches(0),
-            Inches(0),
-            width=slide_width,
-            height=slide_height
-        )
+        bg_shape = add_background_picture(slide, background_data, slide_width, slide_height, image_parts)
         # Send to back so text boxes appear on top
         # Move shape to beginning of shape tree (back)
         spTree = slide.shapes._spTree
@@ -251,20 +481,20 @@ def create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, backgr
         height = int(h_pct * slide_height)
         
         # Ensure minimum dimensions
-        if width < Inches(1):
-            width = Inches(2)
-        if height < Inches(0.4):
-            height = Inches(0.6)
+        if width < _MIN_W:
+            width = _FALLBACK_W
+        if height < _MIN_H:
+            height = _FALLBACK_H
         
         # Clamp to slide boundaries
         if left < 0:
-            left = int(Inches(0.2))
+            left = int(_PAD)
         if top < 0:
-            top = int(Inches(0.2))
+            top = int(_PAD)
         if left + width > slide_width:
-            width = int(slide_width - left - Inches(0.2))
+            width = int(slide_width - left - _PAD)
         if top + height > slide_height:
-            height = int(slide_height - top - Inches(0.2))
+            height = int(slide_height - top - _PAD)
         
         # Create text box
         textbox = slide.shapes.add_textbox(left, top, width, height)
@@ -275,16 +505,16 @@ def create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, backgr
         lines = text.split('\n') if '\n' in text else [text]
         bullet_level = elem.get("bullet_level", 0)
         elem_type = elem.get("type", "body")
+        alignment = _ALIGN.get(style.get("alignment", "left"), PP_ALIGN.LEFT)
         
         for i, line in enumerate(lines):
             line = line.strip()
             if not line:
                 continue
             
-            # Check if line starts with bullet character
-            is_bullet_line = line.startswith('•') or line.startswith('-') or line.startswith('*')
-            if is_bullet_line:
-                line = line.lstrip('•-* ').strip()
+            # Detect and strip leading bullet characters in one pass
+            line, bullet_marks = _BULLET_RE.subn('', line)
+            is_bullet_line = bool(bullet_marks)
                 
             if i == 0:
                 p = text_frame.paragraphs[0]
@@ -292,13 +522,7 @@ def create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, backgr
                 p = text_frame.add_paragraph()
             
             # Set alignment
-            alignment = style.get("alignment", "left")
-            if alignment == "center":
-                p.alignment = PP_ALIGN.CENTER
-            elif alignment == "right":
-                p.alignment = PP_ALIGN.RIGHT
-            else:
-                p.alignment = PP_ALIGN.LEFT
+            p.alignment = alignment
             
             # Set bullet level for bullet items
             if bullet_level > 0 or is_bullet_line or elem_type == "bullet":
@@ -359,14 +583,15 @@ def create_pptx_from_pdf_with_ai(pdf_path, output_path):
     print("🤖 Using Gemini AI for intelligent content extraction")
     print()
     
-    # Open PDF
-    doc = fitz.open(pdf_path)
-    
-    # Get first page dimensions to determine aspect ratio
-    first_page = doc[0]
-    pdf_width = first_page.rect.width
-    pdf_height = first_page.rect.height
-    aspect_ratio = pdf_width / pdf_height
+    # Open PDF only long enough to read its layout - render workers open their
+    # own handles, so nothing stays mapped while waiting on the AI requests
+    with fitz.open(pdf_path) as doc:
+        # Get first page dimensions to determine aspect ratio
+        first_page = doc[0]
+        pdf_width = first_page.rect.width
+        pdf_height = first_page.rect.height
+        aspect_ratio = pdf_width / pdf_height
+        total_pages = len(doc)
     
     # Create presentation with matching aspect ratio
     prs = Presentation()
@@ -381,55 +606,45 @@ def create_pptx_from_pdf_with_ai(pdf_path, output_path):
     slide_width = prs.slide_width
     slide_height = prs.slide_height
     
-    total_pages = len(doc)
     print(f"📊 Processing {total_pages} slides...")
     print("   (Background image + editable text overlay)")
     print()
     
     failed_slides = []
+    image_parts = {}  # background image SHA1 -> shared ImagePart
     
-    for page_num in range(total_pages):
-        page = doc[page_num]
-        
-        # Render LOW-res image for AI analysis (saves tokens)
-        ai_image = render_page_to_pil_image(page, dpi=100, for_ai=True)
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4)) as executor:
+        # Render each page once: HIGH-res for the background (preserves visual
+        # quality) plus a LOW-res copy derived from it for AI analysis (saves tokens)
+        render_futures = [executor.submit(_render, pdf_path, page_num, BACKGROUND_DPI)
+                          for page_num in range(total_pages)]
         
-        # Render HIGH-res image for background (preserves visual quality)
-        bg_image = render_page_to_pil_image(page, dpi=200, for_ai=False)
+        # Analyze with Gemini AI - requests overlap, paced by the RPM limiter
+        all_slide_data = asyncio.run(analyze_slides_with_gemini(client, render_futures))
         
-        # Analyze with Gemini AI
-        slide_data = analyze_slide_with_gemini(client, ai_image, page_num + 1)
-        
-        if slide_data and slide_data.get("elements"):
-            # Create slide with background image + editable text overlay
-            create_slide_from_ai_data(prs, slide_data, slide_width, slide_height, background_image=bg_image)
-        else:
-            # Fallback: add image as slide if AI fails
-            failed_slides.append(page_num + 1)
-            print(f"   ⚠ Slide {page_num + 1}: Using image fallback")
-            
-            blank_layout = prs.slide_layouts[6]
-            slide = prs.slides.add_slide(blank_layout)
-            
-            img_bytes = io.BytesIO()
-            bg_image.save(img_bytes, format='PNG')
-            img_bytes.seek(0)
+        for page_num, slide_data in enumerate(all_slide_data):
+            _, (bg_data, _) = render_futures[page_num].result()
             
-            slide.shapes.add_picture(
-                img_bytes,
-                Inches(0),
-                Inches(0),
-                width=slide_width,
-                height=slide_height
-            )
+            if slide_data and slide_data.get("elements"):
+                # Create slide with background image + editable text overlay
+                create_slide_from_ai_data(prs, slide_data, slide_width, slide_height,
+                                          background_data=bg_data, image_parts=image_parts)
+            else:
+                # Fallback: add image as slide if AI fails
+                failed_slides.append(page_num + 1)
+                print(f"   ⚠ Slide {page_num + 1}: Using image fallback")
+                
+                blank_layout = prs.slide_layouts[6]
+                slide = prs.slides.add_slide(blank_layout)
+                
+                add_background_picture(slide, bg_data, slide_width, slide_height, image_parts)
         
-        # Rate limiting for free tier: gemini-2.5-flash-lite = 10 RPM
-        # Using 10 seconds to stay well within limits and avoid retry loops
-        if page_num < total_pages - 1:
-            time.sleep(10)
+        # Serialize the PPTX on a background thread while the worker pool shuts down
+        saver = ThreadPoolExecutor(max_workers=1)
+        save_future = saver.submit(prs.save, output_path)
+        saver.shutdown(wait=False)
     
-    doc.close()
-    prs.save(output_path)
+    save_future.result()  # wait for the save and re-raise any error from it
     
     print()
     print(f"✅ PPTX created: {output_path}")
@@ -466,6 +681,7 @@ def create_pptx_from_pdf_images(pdf_path, output_path):
     slide_width = prs.slide_width
     slide_height = prs.slide_height
     blank_layout = prs.slide_layouts[6]
+    image_parts = {}  # background image SHA1 -> shared ImagePart
     
     print("📷 Using image-only mode (slides not editable)")
     
@@ -474,22 +690,10 @@ def create_pptx_from_pdf_images(pdf_path, output_path):
         slide = prs.slides.add_slide(blank_layout)
         
         # Render high-res image
-        zoom = 200 / 72
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG', optimize=True)
-        img_bytes.seek(0)
+        img = render_page_to_pil_image(page, dpi=BACKGROUND_DPI)
         
-        slide.shapes.add_picture(
-            img_bytes,
-            Inches(0),
-            Inches(0),
-            width=slide_width,
-            height=slide_height
-        )
+        add_background_picture(slide, encode_background_image(img),
+                               slide_width, slide_height, image_parts)
     
     doc.close()
     prs.save(output_path)
@@ -1,5 +1,17 @@
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextContainer
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+# Documents longer than this are split across worker processes
+PARALLEL_PAGE_THRESHOLD = 32
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int):
+    """Worker: extract text for pages [start, stop) from its own document handle."""
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text("text").strip() for i in range(start, stop)]
+
 
 def extract_text_by_page(pdf_path: str):
     """
@@ -10,18 +22,19 @@ def extract_text_by_page(pdf_path: str):
             ...
         ]
     """
-    pages_text = []
-
-    for page_layout in extract_pages(pdf_path):
-        page_text = []
-        for element in page_layout:
-            if isinstance(element, LTTextContainer):
-                page_text.append(element.get_text())
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+        if page_count <= PARALLEL_PAGE_THRESHOLD:
+            return [doc[i].get_text("text").strip() for i in range(page_count)]
 
-        cleaned_text = "\n".join(page_text).strip()
-        pages_text.append(cleaned_text)
+    # PyMuPDF holds the GIL, so large documents are split across processes
+    workers = min(os.cpu_count() or 1, 4)
+    chunk = -(-page_count // workers)  # ceiling division
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
 
-    return pages_text
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_page_range, pdf_path, start, stop) for start, stop in ranges]
+        return [text for future in futures for text in future.result()]
 
 
 if __name__ == "__main__":
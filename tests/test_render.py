@@ -0,0 +1,35 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent.parent / "converter"))
+import pdf_to_pptx
+
+
+def _make_pdf(path, width, height):
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    page.insert_text((72, 100), "Quarterly Review", fontsize=36)
+    doc.save(path)
+    doc.close()
+
+
+@pytest.mark.parametrize("width, height", [(960, 540), (1191, 842), (1440, 810), (4800, 2700)])
+@pytest.mark.parametrize("dpi", [pdf_to_pptx.BACKGROUND_DPI, 200])
+def test_render_wide_pages(tmp_path, width, height, dpi):
+    pdf_path = str(tmp_path / "page.pdf")
+    _make_pdf(pdf_path, width, height)
+
+    (ai_bytes, ai_mime), (bg_bytes, bg_mime) = pdf_to_pptx._render(pdf_path, 0, dpi)
+
+    assert ai_mime == bg_mime == "image/jpeg"
+    ai_image = Image.open(io.BytesIO(ai_bytes))
+    bg_image = Image.open(io.BytesIO(bg_bytes))
+    assert max(ai_image.size) <= 1200
+    assert abs(bg_image.width - width * dpi / 72) <= 1
+    assert abs(bg_image.height - height * dpi / 72) <= 1